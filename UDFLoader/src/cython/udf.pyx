@@ -359,19 +359,21 @@ cdef public object load_udf(const char* name, config_t* config) with gil:
     try:
         lib = importlib.import_module(f'{py_name}')
 
-        arg_names = inspect.getargspec(lib.Udf.__init__).args[1:]
-        if len(arg_names) > 0:
-            # Skipping the first argument since it is the self argument
-            args = []
-            for a in arg_names:
-                key = bytes(a, 'utf-8')
-                value = config_get(config, key)
-                if value == NULL:
-                    raise KeyError(f'UDF config missing key: {a}')
-                py_value = cfv_to_object(value)
-                args.append(py_value)
-        else:
-            args = []
+        # Only positional parameters are filled in from the config, the
+        # same set inspect.getargspec() used to return in args. Skipping the
+        # first one since it is the self argument
+        positional = (inspect.Parameter.POSITIONAL_ONLY,
+                      inspect.Parameter.POSITIONAL_OR_KEYWORD)
+        params = inspect.signature(lib.Udf.__init__).parameters.values()
+        arg_names = [p.name for p in params if p.kind in positional][1:]
+        args = []
+        for a in arg_names:
+            key = bytes(a, 'utf-8')
+            value = config_get(config, key)
+            if value == NULL:
+                raise KeyError(f'UDF config missing key: {a}')
+            py_value = cfv_to_object(value)
+            args.append(py_value)
 
         return lib.Udf(*args)
     except AttributeError:
@@ -34,8 +34,8 @@ class Udf:
         """
         meta['ADDED'] = 55
         if isinstance(frame, list):
-            for i in range(len(frame)):
-                frame[i].fill(1)
+            for f in frame:
+                f.fill(1)
         else:
             frame.fill(1)
         return False, frame, meta
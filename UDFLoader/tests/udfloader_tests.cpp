@@ -220,6 +220,20 @@ TEST(udfloader_tests, py_config) {
     delete handle;
 }
 
+// Test to verify only positional constructor arguments come from the config
+TEST(udfloader_tests, py_var_args) {
+    // Load a configuration
+    config_t* config = json_config_new("test_config.json");
+    ASSERT_NOT_NULL(config);
+
+    // Initialize the UDFLoader and load the UDF
+    UdfHandle* handle = loader->load("py_tests.var_args", config, 1);
+    ASSERT_NOT_NULL(handle);
+
+    // Clean up
+    delete handle;
+}
+
 // Test for exception in constructor
 TEST(udfloader_tests, py_constructor_error) {
     // Load a configuration
@@ -20,9 +20,10 @@
 
 
 import logging
+import threading
 import cv2
-import numpy as np
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from random import uniform
 
@@ -54,8 +55,9 @@ class Udf:
         self.log = logging.getLogger('PCB_FILTER')
         self.log.debug("In ctor")
         self.ratio = scale_ratio
-        # Initialize background subtractor
-        self.fgbg = cv2.createBackgroundSubtractorMOG2()
+        # Initialize background subtractor. Shadow detection is disabled so
+        # that the foreground mask is strictly 0/255 and can be used as is
+        self.fgbg = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
         # Total white pixel # on MOG applied
         # frame after morphological operations
         self.n_total_px = n_total_px/(self.ratio*self.ratio)
@@ -72,62 +74,168 @@ class Udf:
         self.count = 0
         self.lock_frame_count = 0
         self.threads = 0
+        # Structuring element used to close the MOG mask
+        self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_RECT,
+                                                       (20, 20))
+        # Width in pixels of the left and right edges of frame that the
+        # PCB must not touch
+        self._edge_w = 10
+        # Width of the last foreground mask and the range the PCB center
+        # has to lie in for it, recomputed whenever the width changes. Kept
+        # in one tuple so that concurrent process() calls see a consistent
+        # set
+        self._cx_bounds = (None, None, None)
+        # Frame handler for the current state of the filter: training,
+        # waiting for a key frame or locked after forwarding one
+        if self.training_mode is True:
+            self._process_fn = self._process_train
+            # Training frames are written out from background threads so
+            # that encoding them does not stall ingestion, with at most 8
+            # writes pending at a time
+            self._writer = ThreadPoolExecutor(max_workers=2)
+            self._pending_writes = threading.BoundedSemaphore(8)
+        else:
+            self._process_fn = self._process_idle
 
-    def _check_frame(self, frame):
-        """Determines if the given frame is the key frame of interest for
-        further processing or not
+    def _apply_bg(self, frame):
+        """Applies the background subtractor on the given frame, updating
+        the background model
 
         :param frame: frame blob
         :type frame: numpy.ndarray
+        :return: foreground mask of the frame
+        :rtype: numpy.ndarray
+        """
+        return self.fgbg.apply(frame)
+
+    def _gate(self, fgmask):
+        """Determines if the frame the given foreground mask was computed
+        from is the key frame of interest for further processing or not
+
+        :param fgmask: foreground mask returned by _apply_bg()
+        :type fgmask: numpy.ndarray
         :return: True if the given frame is a key frame, else False
         :rtype: bool
         """
-        # Apply background subtractor on frame
-        fgmask = self.fgbg.apply(frame)
-        rows, columns = fgmask.shape
-        if self.filter_lock is False:
-            # Applying morphological operations
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (20, 20))
-            ret, thresh = cv2.threshold(fgmask, 0, 255,
-                                        cv2.THRESH_BINARY+cv2.THRESH_OTSU)
-            thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-            # Crop left and right edges of frame
-            left = thresh[:, 0:10]
-            right = thresh[:, (columns - 10):(columns)]
-
-            # Count the # of white pixels in thresh
-            n_total = np.sum(thresh == 255)
-            n_left = np.sum(left == 255)
-            n_right = np.sum(right == 255)
-            # If the PCB is in view of camera & is not
-            # touching the left, right edge of frame
-            if (n_total > self.n_total_px) & \
-                (n_left < self.n_left_px) & \
-                    (n_right < self.n_right_px):
-                # Find the PCB contour
-                contours, hier = cv2.findContours(thresh.copy(),
-                                                  cv2.RETR_EXTERNAL,
-                                                  cv2.CHAIN_APPROX_NONE)
-                if len(contours) != 0:
-                    # Contour with largest area would be bounding the PCB
-                    c = max(contours, key=cv2.contourArea)
-
-                    # Obtain the bounding rectangle
-                    # for the contour and calculate the center
-                    x, y, w, h = cv2.boundingRect(c)
-                    cX = int(x + (w / 2))
-
-                    # If the rectangle bounding the
-                    # PCB doesn't touch the left or right edge
-                    # of frame and the center x lies within
-                    if (x != 0) & ((x + w) != columns) & \
-                       ((columns/2 - (100/self.ratio)) <= cX and
-                       cX <= (columns/2 + (100/self.ratio))):
-                        return True
-                    else:
-                        return False
+        columns = fgmask.shape[1]
+        cx_bounds = self._cx_bounds
+        if cx_bounds[0] != columns:
+            half_width = columns / 2
+            cx_bounds = (columns, half_width - (100 / self.ratio),
+                         half_width + (100 / self.ratio))
+            self._cx_bounds = cx_bounds
+        _, cx_lo, cx_hi = cx_bounds
+        # Applying morphological operations. Without shadow detection the
+        # foreground mask is already binary, so it needs no thresholding
+        closed = cv2.morphologyEx(fgmask, cv2.MORPH_CLOSE, self._morph_kernel)
+        # Count the # of white pixels in the left and right edges. The
+        # mask is strictly 0/255, so countNonZero gives the same result
+        # without a boolean temporary. The edge slices are strided uint8
+        # views into closed, so no copy is made either
+        n_left = cv2.countNonZero(closed[:, 0:self._edge_w])
+        n_right = cv2.countNonZero(closed[:, -self._edge_w:])
+        # Bail out early if the PCB is touching the left or right edge
+        # of frame, before counting the white pixels in the whole mask
+        if n_left >= self.n_left_px or n_right >= self.n_right_px:
+            return False
+        n_total = cv2.countNonZero(closed)
+        # If the PCB is in view of camera
+        if n_total > self.n_total_px:
+            # Find the PCB contour. findContours no longer modifies its
+            # input in OpenCV 4, so closed need not be copied. Only the area
+            # and bounding rectangle are used, which compressing straight
+            # runs of boundary points does not change
+            contours, hier = cv2.findContours(closed,
+                                              cv2.RETR_EXTERNAL,
+                                              cv2.CHAIN_APPROX_SIMPLE)
+            if len(contours) != 0:
+                # Contour with largest area would be bounding the PCB
+                c = max(contours, key=cv2.contourArea)
+
+                # Obtain the bounding rectangle
+                # for the contour and calculate the center
+                x, y, w, h = cv2.boundingRect(c)
+                cX = x + w // 2
+
+                # If the rectangle bounding the
+                # PCB doesn't touch the left or right edge
+                # of frame and the center x lies within
+                if x != 0 and (x + w) != columns and \
+                   cx_lo <= cX <= cx_hi:
+                    return True
+                else:
+                    return False
         return False
 
+    def _resize(self, frame):
+        """Downscales the given frame by the configured scale ratio, the
+        filter logic only works on the downscaled frame
+
+        :param frame: frame blob
+        :type frame: numpy.ndarray
+        :return: downscaled frame
+        :rtype: numpy.ndarray
+        """
+        frame_height, frame_width = frame.shape[:-1]
+        return cv2.resize(frame, (int(frame_width/self.ratio),
+                                  int(frame_height/self.ratio)))
+
+    def _process_train(self, frame, metadata):
+        """Saves every frame it receives for training, see process()
+        """
+        self.count = self.count + 1
+        self._pending_writes.acquire()
+        # The frame buffer is released once process() returns, so the
+        # writer gets its own copy of it
+        future = self._writer.submit(
+            cv2.imwrite, "/EII/test_videos/"+str(self.count)+".png",
+            frame.copy())
+        future.add_done_callback(self._on_write_done)
+        return True, None, None
+
+    def _on_write_done(self, future):
+        """Callback for a finished training frame write
+
+        :param future: future of the cv2.imwrite() call
+        :type future: concurrent.futures.Future
+        """
+        self._pending_writes.release()
+        if future.exception() is not None:
+            self.log.error("Failed to write training frame: {}".format(
+                future.exception()))
+        elif future.result() is False:
+            # cv2.imwrite() reports most failures, like a missing output
+            # directory, by returning False rather than raising
+            self.log.error("Failed to write training frame")
+
+    def _process_idle(self, frame, metadata):
+        """Forwards the frame if it is a key frame, see process()
+        """
+        if self._gate(self._apply_bg(self._resize(frame))):
+            self.filter_lock = True
+            # Re-initialize frame count during trigger lock to 0
+            self.lock_frame_count = 0
+            self._process_fn = self._process_locked
+            return False, None, metadata
+        else:
+            return True, None, None
+
+    def _process_locked(self, frame, metadata):
+        """Drops the frame while the trigger is locked, see process()
+        """
+        # Continue applying background subtractor to
+        # keep track of PCB positions, the key frame gate itself
+        # is not needed while the trigger is locked
+        self._apply_bg(self._resize(frame))
+        # Increment frame count during trigger lock phase
+        self.lock_frame_count = self.lock_frame_count + 1
+        if self.lock_frame_count == 7:
+            # Clear trigger lock after timeout
+            # period (measured in frame count here)
+            self.filter_lock = False
+            self._process_fn = self._process_idle
+        return True, None, None
+
     def process(self, frame, metadata):
         """Processes every frame it receives based on the filter logic used
 
@@ -139,31 +247,4 @@ class Udf:
                    new metadata for the frame if any)
         :rtype: (bool, numpy.ndarray, str)
         """
-        frame_height, frame_width = frame.shape[:-1]
-        resized_frame = cv2.resize(frame, (int(frame_width/self.ratio),
-                                           int(frame_height/self.ratio)))
-
-        if self.training_mode is True:
-            self.count = self.count + 1
-            cv2.imwrite("/EII/test_videos/"+str(self.count)+".png", frame)
-            return True, None, None
-        else:
-            if self.filter_lock is False:
-                if self._check_frame(resized_frame):
-                    self.filter_lock = True
-                    # Re-initialize frame count during trigger lock to 0
-                    self.lock_frame_count = 0
-                    return False, None, metadata
-                else:
-                    return True, None, None
-            else:
-                # Continue applying background subtractor to
-                # keep track of PCB positions
-                self._check_frame(resized_frame)
-                # Increment frame count during trigger lock phase
-                self.lock_frame_count = self.lock_frame_count + 1
-                if self.lock_frame_count == 7:
-                    # Clear trigger lock after timeout
-                    # period (measured in frame count here)
-                    self.filter_lock = False
-                return True, None, None
+        return self._process_fn(frame, metadata)